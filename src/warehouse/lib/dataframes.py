@@ -1,15 +1,17 @@
 import pandas as pd
 import pathlib as Path
 import json
-from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import logging
 
 from warehouse.lib.general import produce_dir, identify_exptid_from_path
 from warehouse.lib.exceptions import DataFormatError
 
-#Get logging process
+# Get logging process
 log = logging.getLogger("dataframes")
 
+
 def collapse_repeat_columns(df: pd.DataFrame, field_roots: list) -> pd.DataFrame:
     """
     Merging dataframes creates duplicated fields that only differ by a suffix e.g. _pcr
@@ -22,17 +24,17 @@ def collapse_repeat_columns(df: pd.DataFrame, field_roots: list) -> pd.DataFrame
     Returns:
         df (pd.DataFrame): The pandas DataFrame with the duplicate columns dropped.
     """
-    
-    #Copy df so there aren't any slice conflicts
+
+    # Copy df so there aren't any slice conflicts
     df = df.copy(deep=True)
 
     for root in field_roots:
         # Identify all the fields
         repeat_cols = [col for col in df.columns if col.startswith(root)]
-        # Stack all entries for columns, then take the first entry (not null) of each group ie assumes they are identical
-        # Reindex in case all columns have an empty value, which should never happen, but better to be safe
+        # Take the first entry (not null) across the columns of each row ie assumes they are identical
+        # Rows where all columns have an empty value stay empty
         df["interim"] = (
-            df[repeat_cols].stack().groupby(level=0).first().reindex(df.index)
+            df[repeat_cols].bfill(axis=1).iloc[:, 0] if repeat_cols else None
         )
         # Remove all repeat columns
         df.drop(columns=repeat_cols, inplace=True)
@@ -42,6 +44,84 @@ def collapse_repeat_columns(df: pd.DataFrame, field_roots: list) -> pd.DataFrame
     return df
 
 
+def set_shared_categories(
+    dfs: list[pd.DataFrame], columns: list[str]
+) -> list[pd.DataFrame]:
+    """
+    Convert columns to a single categorical dtype shared by all of the dataframes, so
+    that merges on these columns join on the category codes rather than the strings.
+
+    Args:
+        dfs (list[pd.DataFrame]): The pandas DataFrames to convert columns in.
+        columns (list): Column names to convert, where present in each DataFrame.
+
+    Returns:
+        dfs (list[pd.DataFrame]): The pandas DataFrames with the columns converted.
+    """
+
+    for column in columns:
+        # Categories must be identical on both sides of a merge, otherwise pandas
+        # falls back to joining on the values. Outer merges order categorical keys by
+        # their codes, so sort the categories to keep the same order as the values
+        categories = (
+            pd.concat([df[column] for df in dfs if column in df.columns])
+            .dropna()
+            .unique()
+        )
+        dtype = pd.CategoricalDtype(sorted(categories))
+        dfs = [df.astype({column: dtype}) if column in df.columns else df for df in dfs]
+
+    return dfs
+
+
+def unset_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert all categorical columns back to the dtype of their categories.
+
+    Args:
+        df (pd.DataFrame): The pandas DataFrame to convert columns in.
+
+    Returns:
+        df (pd.DataFrame): The pandas DataFrame without categorical columns.
+    """
+
+    categorical = df.select_dtypes("category")
+    return df.astype(
+        {col: categorical[col].cat.categories.dtype for col in categorical.columns}
+    )
+
+
+def aggregate_entries_to_lists(df: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """
+    Group a dataframe and collect the non-missing entries of every other column into
+    a list per group, with groups that have a missing key kept.
+
+    Args:
+        df (pd.DataFrame): The pandas DataFrame to aggregate.
+        by (list): Column names to group by.
+
+    Returns:
+        df (pd.DataFrame): One row per group with the group keys and a list per column.
+    """
+
+    # Only keep groups that occur, in case any of the keys are categorical
+    grouped = df.groupby(by, dropna=False, observed=True)
+    # Group numbers follow the order of the group keys
+    codes = grouped.ngroup().to_numpy()
+    summary_df = grouped.size().index.to_frame(index=False)
+
+    # Append each entry to its group's list in one pass, rather than building a
+    # Series per group and column
+    for col in df.columns.difference(by, sort=False):
+        buckets = [[] for _ in range(len(summary_df))]
+        present = df[col].notna().to_numpy()
+        for code, entry in zip(codes[present], df[col][present].tolist()):
+            buckets[code].append(entry)
+        summary_df[col] = buckets
+
+    return summary_df
+
+
 def count_non_none_entries_in_dfcolumn(df: pd.DataFrame, column: str) -> int:
     """
     Function counts the number of non none entries in a column of a dataframe
@@ -53,13 +133,9 @@ def count_non_none_entries_in_dfcolumn(df: pd.DataFrame, column: str) -> int:
         int : Count of entries in the column that are not None.
     """
 
-    return len(
-        [
-            item
-            for item in list(chain.from_iterable(df[f"{column}"]))
-            if not item == "None"
-        ]
-    )
+    # Flatten the lists in one pass, empty lists become a missing entry
+    entries = df[column].explode()
+    return int(entries.notna().sum())
 
 
 def export_df_to_csv(df: pd.DataFrame, folder: Path, filename: str) -> None:
@@ -75,7 +151,10 @@ def export_df_to_csv(df: pd.DataFrame, folder: Path, filename: str) -> None:
     """
 
     path = folder / filename
-    df.to_csv(path, index=False)
+    # Write through a large buffer with a fixed encoding and line ending, so each
+    # file is flushed to disk in a few writes and is identical across platforms
+    with open(path, "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+        df.to_csv(f, index=False, lineterminator="\n")
 
 
 def identify_export_dataframe_attributes(obj, output_dir):
@@ -87,40 +166,88 @@ def identify_export_dataframe_attributes(obj, output_dir):
         output_dir: The directory where the CSV files will be saved.
     """
     log.info("   Exporting dataframe attributes:")
-    for attr_name in dir(obj):
-        attr = getattr(obj, attr_name)
-        if isinstance(attr, pd.DataFrame):
-            produce_dir(output_dir)
-            csv_file = f"{output_dir}/{attr_name}.csv"
-            attr.to_csv(csv_file, index=False)
-            log.info(f"      '{attr_name}' saved to {csv_file}")
+    # DataFrames are only ever set on the instance, so skip the class attributes in dir()
+    dataframes = {
+        attr_name: attr
+        for attr_name, attr in sorted(vars(obj).items())
+        if isinstance(attr, pd.DataFrame)
+    }
+    if dataframes:
+        produce_dir(output_dir)
+    for attr_name, attr in dataframes.items():
+        csv_file = f"{output_dir}/{attr_name}.csv"
+        export_df_to_csv(attr, output_dir, f"{attr_name}.csv")
+        log.info(f"      '{attr_name}' saved to {csv_file}")
     log.info("   Done")
 
-def merge_additional_rxn_level_fields(main_df: pd.DataFrame, exp_seq_df: pd.DataFrame, colnames: list[str]) -> pd.DataFrame:
+
+def merge_additional_rxn_level_fields(
+    main_df: pd.DataFrame, exp_seq_df: pd.DataFrame, colnames: list[str]
+) -> pd.DataFrame:
     """
     Function to merge in additional experimental data to a df.
 
     Args:
         main_df (df):  df to have additional data added to
-        exp_seq_df (df):   Experimental data Dataframe to extract data from
+        exp_seq_df (df):   Experimental data Dataframe to extract data from, optionally
+            already indexed on right_exp_id and right_barcode
         colnames list(str): colnames for left_exp_id, left_barcode, right_exp_id, right_barcode
     """
     if len(colnames) != 4:
         log.info("Incorrect number of entries given")
-    
-    df = pd.merge(
-        left=main_df,
-        right=exp_seq_df,
-        left_on=[colnames[0], colnames[1]],
-        right_on=[colnames[2], colnames[3]],
-        how="inner",
-    )
+
+    if list(exp_seq_df.index.names) == [colnames[2], colnames[3]]:
+        # Join against the existing index so it is not rebuilt for every merge
+        df = pd.merge(
+            left=main_df,
+            right=exp_seq_df,
+            left_on=[colnames[0], colnames[1]],
+            right_index=True,
+            how="inner",
+        ).reset_index(drop=True)
+    else:
+        df = pd.merge(
+            left=main_df,
+            right=exp_seq_df,
+            left_on=[colnames[0], colnames[1]],
+            right_on=[colnames[2], colnames[3]],
+            how="inner",
+        )
     # Ensure duplicate columns are collapsed to a single one
     df = collapse_repeat_columns(df, ["sample_id", "expt_id", "barcode"])
     return df
 
-def concat_files_add_expID(files: list[Path], EXP_ID_COL: str = 'expt_id') -> pd.DataFrame:
 
+def extract_file_add_expID(
+    file: Path, expid: str, EXP_ID_COL: str = "expt_id"
+) -> pd.DataFrame:
+    """
+    Function to extract a single csv or json file into a df and add in the experimental ID.
+
+    Args:
+        file (Path):  Path to the file
+        expid (str):   Experimental ID for the file
+        EXP_ID_COL (str):   Column name for experimental ID
+    """
+    if file.suffix == ".csv":
+        data = pd.read_csv(file)
+        data[EXP_ID_COL] = expid
+
+    elif file.suffix == ".json":
+        with open(file, "r") as f:
+            json_dict = json.load(f)
+        data = pd.DataFrame(json_dict, index=[expid]).reset_index()
+        data.rename(columns={"index": EXP_ID_COL}, inplace=True)
+
+    else:
+        raise DataFormatError(f"Unsupported file type {file}")
+
+    return data
+
+
+def concat_files_add_expID(
+    files: list[Path], EXP_ID_COL: str = "expt_id"
+) -> pd.DataFrame:
     """
     Function to extract and concatenate multiple files of the same type into a df.
 
@@ -128,33 +255,34 @@ def concat_files_add_expID(files: list[Path], EXP_ID_COL: str = 'expt_id') -> pd
         files list(Path):  List of Path names
         EXP_ID_COL (str):   Column name for experimental ID
     """
-    # Create empty df to add data to and list of expids
-    df = pd.DataFrame()
+    # Create list of expids
     expids = []
 
-    # Extract data, add in experiment ID and concatenate all data
+    # Identify experiment IDs and check for duplicates before extracting any data
     for file in files:
         expid = identify_exptid_from_path(file)
-        if  file.suffix == ".csv":
-            data = pd.read_csv(file)  
-            data[EXP_ID_COL] = expid
-        
-        if file.suffix == ".json":
-            with open(file, 'r') as f:
-                json_dict = json.load(f)
-            data = pd.DataFrame(json_dict, index=[expid]).reset_index()
-            data.rename(columns={'index': EXP_ID_COL}, inplace=True)
-        
         if expid in expids:
             raise DataFormatError(f"{expid} duplicate experiment ID detected: ")
-        
-        #Add expid to list
+
+        # Add expid to list
         expids.append(expid)
-        
-        df = pd.concat([df, data], ignore_index=True)
-    return df
 
-def filtered_dataframe(df : pd.DataFrame, colname: str, values: list[str]) -> pd.DataFrame:
+    if not files:
+        return pd.DataFrame()
+
+    # Parsing releases the GIL, so extract the files concurrently
+    with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+        frames = list(
+            executor.map(extract_file_add_expID, files, expids, repeat(EXP_ID_COL))
+        )
+
+    # Concatenate all data in a single pass rather than growing a df per file
+    return pd.concat(frames, ignore_index=True)
+
+
+def filtered_dataframe(
+    df: pd.DataFrame, colname: str, values: list[str]
+) -> pd.DataFrame:
     """
     Filters the DataFrame based on the selected experiment IDs.
 
@@ -166,10 +294,11 @@ def filtered_dataframe(df : pd.DataFrame, colname: str, values: list[str]) -> pd
     Returns:
         pd.DataFrame: The filtered DataFrame.
     """
-        
+
     df_filtered = df.query(f"{colname} in @values")
     return df_filtered
 
+
 def dataframe_not_empty(df) -> bool:
     """
     Checks if a DataFrame or Series is not empty.
@@ -180,4 +309,4 @@ def dataframe_not_empty(df) -> bool:
     Returns:
         bool: True if the DataFrame is not empty, False otherwise.
     """
-    return not df.empty
\ No newline at end of file
+    return not df.empty
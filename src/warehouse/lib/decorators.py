@@ -1,4 +1,11 @@
+import hashlib
+import json
+import os
 from functools import wraps
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
 
 
 def singleton(cls):
@@ -17,3 +24,55 @@ def singleton(cls):
 
     # Return the inner function
     return get_instance
+
+
+def cache_by_file_mtime(func):
+    # Optionally cache the dict of DataFrames returned by a function whose first
+    # argument is a file path, so the file is only processed again when it has been
+    # modified. Nothing is cached unless the caller passes a cache_dir. Outputs are
+    # stored as JSON table files, so loading a cache never executes code
+
+    @wraps(func)
+    def get_output(file_path: Path, *args, cache_dir: Path = None, **kwargs):
+        if cache_dir is None:
+            return func(file_path, *args, **kwargs)
+
+        # Key on the file, its size and modification time
+        stat = os.stat(file_path)
+        key = f"{Path(file_path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        cache_path = Path(cache_dir, f"{digest}.json")
+
+        # Return the cached output if present and readable
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            return {
+                name: pd.read_json(StringIO(table), orient="table")
+                for name, table in cached.items()
+            }
+        except (OSError, ValueError):
+            pass
+
+        output = func(file_path, *args, **kwargs)
+
+        # Write to a temporary file first so concurrent processes never read a
+        # partially written cache, and never fail because the cache can't be written
+        try:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        name: df.to_json(orient="table", date_format="iso")
+                        for name, df in output.items()
+                    },
+                    f,
+                )
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+
+        return output
+
+    return get_output
@@ -1,6 +1,8 @@
 import configparser
 import logging
+import os
 import re
+from collections import Counter
 from pathlib import Path
 from typing import Optional
 
@@ -24,10 +26,10 @@ def identify_exptid_from_path(path: Path, raise_error: bool = True) -> str:
 
     try:
         # First try with the path name
-        match = re.search(Regex_patterns.NOMADS_EXPID, path.name)
+        match = Regex_patterns.NOMADS_EXPID.search(path.name)
         if match is None:
             # Second try with the full path
-            match = re.search(Regex_patterns.NOMADS_EXPID, str(path))
+            match = Regex_patterns.NOMADS_EXPID.search(str(path))
         if match is None:
             if raise_error:
                 raise DataFormatError(f"Unable to identify an ExpID in: {path}")
@@ -65,9 +67,8 @@ def identify_experiment_files(folder: Path, expt_ids: list) -> list:
     filepaths = []
     for expt_id in expt_ids:
         log.info(f"   Searching for {expt_id} in filename")
-        search_pattern = re.compile(f"{expt_id}")
-
-        matches = [f for f in template_files if search_pattern.search(f.name)]
+        # IDs are literal text, so a substring test is enough without a regex
+        matches = [f for f in template_files if expt_id in f.name]
 
         # Ensure there is at least one match
         if len(matches) == 0:
@@ -106,15 +107,8 @@ def check_duplicate_names(entries):
     Returns:
         A list of filenames that appear more than once.
     """
-    seen_names = set()
-    duplicates = []
-    for entry in entries:
-        filename = entry.name
-        if filename in seen_names:
-            duplicates.append(filename)
-        else:
-            seen_names.add(filename)
-    return duplicates
+    name_counts = Counter(entry.name for entry in entries)
+    return [filename for filename, count in name_counts.items() if count > 1]
 
 
 def check_path_present_raise_error(path: Path, isfile: bool = False) -> bool:
@@ -223,13 +217,15 @@ def identify_all_files(folder: Path, recursive: bool = False) -> list[Path]:
     """
 
     all_files = []
-    for entry in folder.iterdir():
-        if entry.is_file():
-            all_files.append(entry)
-        elif entry.is_dir():
-            if recursive:
-                # Recursively search subdirectories
-                all_files.extend(identify_all_files(entry, True))
+    # scandir entries cache the file type, avoiding a stat call per entry
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                all_files.append(Path(entry.path))
+            elif entry.is_dir():
+                if recursive:
+                    # Recursively search subdirectories
+                    all_files.extend(identify_all_files(Path(entry.path), True))
     return all_files
 
 
@@ -238,6 +234,7 @@ def identify_files_by_search(
     pattern: re.Pattern,
     recursive: bool = False,
     verbose: bool = True,
+    files: Optional[list[Path]] = None,
 ) -> list[Path] | None:
     """
     Identify all files in a folder that match a search pattern"
@@ -247,17 +244,17 @@ def identify_files_by_search(
     pattern (re.pattern):   Compiled RE pattern to match filename against
     recursive (bool):       Select whether search should be recursive
     verbose (bool):         print outputs or now
+    files (list[Path]):     Files already listed from folder_path, to avoid listing
+                            the folder again when searching it for several patterns
 
     Returns:
         list[Path]: List of paths to the matching file(s), or None if not found.
     """
 
     try:
-        matches = [
-            f
-            for f in identify_all_files(folder_path, recursive)
-            if pattern.search(f.name)
-        ]
+        if files is None:
+            files = identify_all_files(folder_path, recursive)
+        matches = [f for f in files if pattern.search(f.name)]
 
         # Check that there are no open files
         check_no_openfiles(matches)
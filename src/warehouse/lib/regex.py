@@ -6,6 +6,9 @@ class Regex_patterns:
     NOMADS_EXPID = re.compile(r"(SW|PC|SL)[a-zA-Z]{2}[0-9]{3}")
     NOMADS_EXP_TEMPLATE = re.compile(r".*(SW|PC|SL)[a-zA-Z]{2}[0-9]{3}.*.xls(x|m)")
 
+    # Nanopore barcodes assigned to each reaction in a sequencing library
+    NANOPORE_BARCODE = re.compile(r"barcode[0-9]{2}")
+
     # OTHER TYPES
     EXCEL_FILE = re.compile(r".*.xls(x|m)")
 
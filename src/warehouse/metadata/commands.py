@@ -49,7 +49,19 @@ from warehouse.metadata.metadata import (
     required=False,
     help="Path to file (csv or xlsx) containing sample metadata information.",
 )
-def metadata(exp_folder: Path, expt_id: str, output_folder: Path, metadata_file: Path):
+@click.option(
+    "-c",
+    "--cache",
+    is_flag=True,
+    help="Reuse data extracted from unchanged template files, stored in output_folder/.cache.",
+)
+def metadata(
+    exp_folder: Path,
+    expt_id: str,
+    output_folder: Path,
+    metadata_file: Path,
+    cache: bool,
+):
     """
     Extract, combine and validate all metadata
     """
@@ -74,7 +86,7 @@ def metadata(exp_folder: Path, expt_id: str, output_folder: Path, metadata_file:
         matching_filepaths = identify_files_by_search(
             exp_folder, Regex_patterns.NOMADS_EXP_TEMPLATE, recursive=True
         )
-        exp_data = ExpMetadataMerge(matching_filepaths, output_folder)
+        exp_data = ExpMetadataMerge(matching_filepaths, output_folder, cache)
 
     # Must be used with an output option
     if metadata_file and output_folder:
@@ -1,6 +1,12 @@
 import logging
+import os
 import re
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import cache, partial
+from itertools import repeat
 from pathlib import Path
 
 import numpy as np
@@ -8,18 +14,23 @@ import pandas as pd
 import pretty_errors
 
 from warehouse.lib.dataframes import (
+    aggregate_entries_to_lists,
     collapse_repeat_columns,
     concat_files_add_expID,
+    export_df_to_csv,
     identify_export_dataframe_attributes,
     merge_additional_rxn_level_fields,
+    set_shared_categories,
+    unset_categories,
 )
-from warehouse.lib.decorators import singleton
+from warehouse.lib.decorators import cache_by_file_mtime, singleton
 from warehouse.lib.exceptions import DataFormatError
 from warehouse.lib.general import (
     create_dict_from_ini,
     filter_dict_by_key_or_value,
     filter_nested_dict,
     get_nested_key_value,
+    identify_all_files,
     identify_exptid_from_path,
     identify_files_by_search,
     produce_dir,
@@ -102,46 +113,182 @@ class ExpDataSchemaFields:
             setattr(self, dict_key.upper(), (field_value, label_value))
 
 
+@cache_by_file_mtime
+def extract_excel_tabs(
+    file_path: Path, tabnames: list[str], dtypes: dict[str, dict] = None
+) -> dict[str, pd.DataFrame]:
+    """
+    Extract data from the named tabs of an Excel file and drop empty rows. If called
+    with a cache_dir, outputs are cached so unmodified files are not parsed again on
+    subsequent runs.
+
+    Args:
+        file_path(Path): Path object to file
+        tabnames(list[str]): Excel tabs in sheet
+        dtypes(dict[str, dict]): Column dtypes for each tab, where known
+
+    Returns:
+        dict[str, pd.DataFrame]: Data from each of the tabs present in the file
+    """
+
+    dtypes = dtypes or {}
+    tabs = {}
+    # Open the workbook once and parse each tab from it, rather than re-reading the
+    # whole file for the sheetnames and again for each tab. Templates are always
+    # .xlsx/.xlsm, so name the engine rather than have pandas sniff the file format
+    with pd.ExcelFile(file_path, engine="openpyxl") as xls:
+        for tabname in tabnames:
+            if tabname in xls.sheet_names:
+                # Extract data and drop empty rows
+                data = xls.parse(sheet_name=tabname, dtype=dtypes.get(tabname))
+                data.dropna(how="all", inplace=True)
+                tabs[tabname] = data
+
+    return tabs
+
+
 class ExpMetadataParser:
     """
     Parse and validate the experimental and individual rxn metadata from an individual Excel spreadsheet.
 
     """
 
+    tabnames = ["expt_metadata", "rxn_metadata"]
+
+    @classmethod
+    def tab_dtypes(cls) -> dict[str, dict]:
+        """
+        Dtypes of the identifier columns in each tab. These are only ever joined to other
+        experimental data, so reading them as strings is safe and skips type inference.
+        Dates and counts are left to pandas, as Excel may store them as either type.
+
+        Returns:
+            dict[str, dict]: Column dtypes for each tab
+        """
+        ExpDataSchema = ExpDataSchemaFields()
+        expt_identifiers = [
+            ExpDataSchema.EXP_ID[0],
+            ExpDataSchema.EXP_TYPE[0],
+            ExpDataSchema.EXP_SUMMARY[0],
+        ]
+        rxn_identifiers = [
+            ExpDataSchema.EXP_ID[0],
+            ExpDataSchema.SWGA_IDENTIFIER[0],
+            ExpDataSchema.PCR_IDENTIFIER[0],
+            ExpDataSchema.SEQLIB_IDENTIFIER[0],
+            ExpDataSchema.BARCODE[0],
+        ]
+        return {
+            cls.tabnames[0]: {col: str for col in expt_identifiers},
+            cls.tabnames[1]: {col: str for col in rxn_identifiers},
+        }
+
+    @classmethod
+    @cache
+    def expt_type_config(cls) -> dict[str, tuple]:
+        """
+        Required, unique and not blank columns, and the barcode pattern, for each expt type.
+        Built once and shared by all parsers, the column lists must not be modified.
+
+        Returns:
+            dict[str, tuple]: (expt_req_cols, rxn_req_cols, rxn_unique_cols,
+                rxn_notblank_cols, barcode_pattern) for each expt type
+        """
+        ExpDataSchema = ExpDataSchemaFields()
+        expt_req_cols = [ExpDataSchema.EXP_ID[0], ExpDataSchema.EXP_ID[0]]
+        return {
+            "seqlib": (
+                expt_req_cols,
+                [
+                    ExpDataSchema.BARCODE[0],
+                    ExpDataSchema.SEQLIB_IDENTIFIER[0],
+                    ExpDataSchema.SAMPLE_ID[0],
+                    ExpDataSchema.EXTRACTION_ID[0],
+                ],
+                [
+                    ExpDataSchema.BARCODE[0],
+                    ExpDataSchema.SEQLIB_IDENTIFIER[0],
+                ],
+                [
+                    ExpDataSchema.SAMPLE_ID[0],
+                    ExpDataSchema.SEQLIB_IDENTIFIER[0],
+                    ExpDataSchema.PCR_IDENTIFIER[0],
+                    ExpDataSchema.SEQLIB_IDENTIFIER[0],
+                ],
+                Regex_patterns.NANOPORE_BARCODE,
+            ),
+            "PCR": (
+                expt_req_cols,
+                [
+                    ExpDataSchema.PCR_IDENTIFIER[0],
+                    ExpDataSchema.SAMPLE_ID[0],
+                    ExpDataSchema.EXTRACTION_ID[0],
+                ],
+                [ExpDataSchema.PCR_IDENTIFIER[0]],
+                [
+                    ExpDataSchema.SAMPLE_ID[0],
+                    ExpDataSchema.EXTRACTION_ID[0],
+                    ExpDataSchema.PCR_IDENTIFIER[0],
+                ],
+                None,
+            ),
+            "sWGA": (
+                expt_req_cols,
+                [
+                    ExpDataSchema.SWGA_IDENTIFIER[0],
+                    ExpDataSchema.SAMPLE_ID[0],
+                    ExpDataSchema.EXTRACTION_ID[0],
+                ],
+                [ExpDataSchema.SWGA_IDENTIFIER[0]],
+                [
+                    ExpDataSchema.SAMPLE_ID[0],
+                    ExpDataSchema.EXTRACTION_ID[0],
+                    ExpDataSchema.SWGA_IDENTIFIER[0],
+                ],
+                None,
+            ),
+        }
+
     def __init__(
         self,
         file_path: Path,
         output_folder: Path = None,
         include_unclassified: bool = False,
+        excel_tabs: dict[str, pd.DataFrame] = None,
     ):
         """
         Load and sanity check the metadata
 
+        Args:
+            excel_tabs (dict): Data already extracted from the tabs of file_path,
+                e.g. when files are extracted in parallel
         """
         # Pull in the dynamically created ExpDataSchema
         ExpDataSchema = ExpDataSchemaFields()
 
         log.info(f"{file_path.name}")
-        self.tabnames = ["expt_metadata", "rxn_metadata"]
         # Store filename
         self.filepath = file_path
 
-        # Extract sheetnames
-        sheets = pd.ExcelFile(file_path).sheet_names
+        # Extract the tabs unless they have already been extracted
+        if excel_tabs is None:
+            excel_tabs = extract_excel_tabs(file_path, self.tabnames, self.tab_dtypes())
         # Check both sheets / tabs are present
-        if not (self.tabnames[0] in sheets and self.tabnames[1] in sheets):
+        if not (self.tabnames[0] in excel_tabs and self.tabnames[1] in excel_tabs):
             raise DataFormatError(f"Missing tabs in {file_path}")
 
         # Load expt data
         ###################
-        self.expt_df = self._extract_excel_data(file_path, self.tabnames[0])
-        self.expt_id = self.expt_df[ExpDataSchema.EXP_ID[0]].iloc[0]
-        self.expt_date = self.expt_df[ExpDataSchema.EXP_DATE[0]].iloc[0]
+        self.expt_df = excel_tabs[self.tabnames[0]]
+        # Pull out the first row once for all of the expt level fields
+        expt_row = self.expt_df.iloc[0]
+        self.expt_id = expt_row[ExpDataSchema.EXP_ID[0]]
+        self.expt_date = expt_row[ExpDataSchema.EXP_DATE[0]]
         self._check_valid_date_format(self.expt_date)
-        self.expt_summary = self.expt_df[ExpDataSchema.EXP_SUMMARY[0]].iloc[0]
-        self.expt_type = self.expt_df[ExpDataSchema.EXP_TYPE[0]].iloc[0]
+        self.expt_summary = expt_row[ExpDataSchema.EXP_SUMMARY[0]]
+        self.expt_type = expt_row[ExpDataSchema.EXP_TYPE[0]]
         # Save the number of samples entered into the assay tab
-        num_rxn = self.expt_df[ExpDataSchema.EXP_RXNS[0]].iloc[0]
+        num_rxn = expt_row[ExpDataSchema.EXP_RXNS[0]]
         # Check validity of expt data
         ###################
         self._define_expt_variables()
@@ -152,22 +299,37 @@ class ExpMetadataParser:
 
         # Load rxn data
         ###################
-        self.rxn_df = self._extract_excel_data(file_path, self.tabnames[1])
+        self.rxn_df = excel_tabs[self.tabnames[1]]
         # Check validity of rxn data
         ###################
         self._check_for_columns(self.rxn_req_cols, self.rxn_df)
         self.rxn_rows = self._check_number_rows(num_rxn, self.rxn_df, self.filepath)
         self._check_entries_unique(self.rxn_unique_cols, self.rxn_df)
         self._check_entries_not_blank(self.rxn_notblank_cols, self.rxn_df)
-        if len(self.barcode_pattern) > 0:
-            self.barcodes = self.rxn_df[ExpDataSchema.BARCODE[0]].tolist()
+        if self.barcode_pattern:
+            self.barcodes = self.rxn_df[ExpDataSchema.BARCODE[0]]
             if include_unclassified:
-                self.barcodes.append("unclassified")
+                self.barcodes = pd.concat(
+                    [self.barcodes, pd.Series(["unclassified"])], ignore_index=True
+                )
             self._check_barcodes_valid()
         log.info("      Rxn metadata passed formatting checks.")
 
         log.info(f"      Merging experimental and rxn data for {self.expt_id}...")
-        self.df = pd.merge(self.expt_df, self.rxn_df, on="expt_id", how="inner")
+        shared_cols = self.expt_df.columns.intersection(self.rxn_df.columns)
+        if len(self.expt_df) == 1 and shared_cols.equals(pd.Index(["expt_id"])):
+            # A single expt row is broadcast onto its rxns, which avoids building a
+            # hash join for a one-to-many merge
+            rxn_df = self.rxn_df[self.rxn_df["expt_id"] == self.expt_id]
+            self.df = pd.concat(
+                [
+                    self.expt_df.iloc[[0] * len(rxn_df)].reset_index(drop=True),
+                    rxn_df.drop(columns="expt_id").reset_index(drop=True),
+                ],
+                axis=1,
+            )
+        else:
+            self.df = pd.merge(self.expt_df, self.rxn_df, on="expt_id", how="inner")
         # Add expt_type back into the rxn dataframe after the merge otherwise there
         # will be duplicate expt_type cols
         self.rxn_df[ExpDataSchema.EXP_TYPE[0]] = self.rxn_df.get(
@@ -184,28 +346,9 @@ class ExpMetadataParser:
             output_dict = {"expt": self.expt_df, "rxn": self.rxn_df}
             for output in output_dict:
                 filename = self.expt_id + "_" + output + "_metadata.csv"
-                path = individual_dir / filename
-                output_dict[output].to_csv(path, index=False)
+                export_df_to_csv(output_dict[output], individual_dir, filename)
         log.info("Done")
 
-    def _extract_excel_data(self, filename: Path, tabname: str) -> pd.DataFrame:
-        """
-        Extract data from valid Excel sheets and return a dataframe.
-
-        Args:
-            filename(Path): Path object to file
-            tabname(str): Excel tab in sheet
-
-        Returns:
-            dataframe: Data from Excel tab
-        """
-
-        # Extract data and drop empty rows
-        data = pd.read_excel(filename, sheet_name=tabname)
-        data.dropna(how="all", inplace=True)
-
-        return data
-
     def _define_expt_variables(self) -> None:
         """
         Define all required fields, counts etc for the exp type.
@@ -213,59 +356,19 @@ class ExpMetadataParser:
         """
         log.info(f"      Identified as {self.expt_type} type experiment")
         self.rxn_identifier_col = self.expt_type + "_identifier"
-        ExpDataSchema = ExpDataSchemaFields()
 
-        if self.expt_type == "seqlib":
-            self.expt_req_cols = [ExpDataSchema.EXP_ID[0], ExpDataSchema.EXP_ID[0]]
-            self.rxn_req_cols = [
-                ExpDataSchema.BARCODE[0],
-                ExpDataSchema.SEQLIB_IDENTIFIER[0],
-                ExpDataSchema.SAMPLE_ID[0],
-                ExpDataSchema.EXTRACTION_ID[0],
-            ]
-            self.rxn_unique_cols = [
-                ExpDataSchema.BARCODE[0],
-                ExpDataSchema.SEQLIB_IDENTIFIER[0],
-            ]
-            self.rxn_notblank_cols = [
-                ExpDataSchema.SAMPLE_ID[0],
-                ExpDataSchema.SEQLIB_IDENTIFIER[0],
-                ExpDataSchema.PCR_IDENTIFIER[0],
-                ExpDataSchema.SEQLIB_IDENTIFIER[0],
-            ]
-            self.barcode_pattern = "barcode[0-9]{2}"
-        elif self.expt_type == "PCR":
-            self.expt_req_cols = [ExpDataSchema.EXP_ID[0], ExpDataSchema.EXP_ID[0]]
-            self.rxn_req_cols = [
-                ExpDataSchema.PCR_IDENTIFIER[0],
-                ExpDataSchema.SAMPLE_ID[0],
-                ExpDataSchema.EXTRACTION_ID[0],
-            ]
-            self.rxn_unique_cols = [ExpDataSchema.PCR_IDENTIFIER[0]]
-            self.rxn_notblank_cols = [
-                ExpDataSchema.SAMPLE_ID[0],
-                ExpDataSchema.EXTRACTION_ID[0],
-                ExpDataSchema.PCR_IDENTIFIER[0],
-            ]
-            self.barcode_pattern = ""
-        elif self.expt_type == "sWGA":
-            self.expt_req_cols = [ExpDataSchema.EXP_ID[0], ExpDataSchema.EXP_ID[0]]
-            self.rxn_req_cols = [
-                ExpDataSchema.SWGA_IDENTIFIER[0],
-                ExpDataSchema.SAMPLE_ID[0],
-                ExpDataSchema.EXTRACTION_ID[0],
-            ]
-            self.rxn_unique_cols = [ExpDataSchema.SWGA_IDENTIFIER[0]]
-            self.rxn_notblank_cols = [
-                ExpDataSchema.SAMPLE_ID[0],
-                ExpDataSchema.EXTRACTION_ID[0],
-                ExpDataSchema.SWGA_IDENTIFIER[0],
-            ]
-            self.barcode_pattern = ""
-        else:
+        config = self.expt_type_config().get(self.expt_type)
+        if config is None:
             raise DataFormatError(
                 f"Error experiment type given as {self.expt_type}, expected seqlib, PCR or sWGA."
             )
+        (
+            self.expt_req_cols,
+            self.rxn_req_cols,
+            self.rxn_unique_cols,
+            self.rxn_notblank_cols,
+            self.barcode_pattern,
+        ) = config
 
     def _check_number_rows(
         self, num_rows: int, df: pd.DataFrame, filename: Path
@@ -298,50 +401,58 @@ class ExpMetadataParser:
             columns(list): List of column names
             df(dataframe): dataframe to assess
         """
-        for c in columns:
-            if c not in df:
-                raise DataFormatError(f"Metadata must contain column called {c}!")
+        # Report all of the missing columns at once so they can be fixed in one go
+        missing = [c for c in dict.fromkeys(columns) if c not in df.columns]
+        if missing:
+            raise DataFormatError(
+                f"Metadata must contain column(s) called {', '.join(missing)}!"
+            )
 
     def _check_entries_unique(self, columns: list, df: pd.DataFrame) -> None:
         """
-        Check entires of the required columns are unique
+        Check entires of the required columns are unique. Missing entries are not
+        counted as duplicates, as blanks are checked for separately.
 
         Args:
             columns(list): List of column names
             df(dataframe): dataframe to assess
-
-        TODO: this will also disallow missing?
         """
 
         for c in columns:
-            all_entries = df[c].tolist()
-            observed_entries = []
-            for entry in all_entries:
-                if entry in observed_entries:
-                    raise DataFormatError(
-                        f"Column {c} entries should be unique, but {entry} is duplicated."
-                    )
-                observed_entries.append(entry)
+            # Flag every repeat of an entry already seen in the column
+            duplicated = df[c].duplicated(keep="first") & df[c].notna()
+            if duplicated.any():
+                entries = df.loc[duplicated, c].unique().tolist()
+                raise DataFormatError(
+                    f"Column {c} entries should be unique, but {entries} duplicated."
+                )
 
     def _check_barcodes_valid(self) -> None:
         """
         Check the barcode entries are valid
 
         """
-        for barcode in self.barcodes:
-            if barcode == "unclassified":
-                continue
-            m = re.match(self.barcode_pattern, str(barcode))
-            if m is None:
-                raise DataFormatError(
-                    f"Error in barcode name for {barcode}. To be valid, must match this regexp: {self.barcode_pattern}."
-                )
+        barcodes = self.barcodes.astype(str)
+        # Match all barcodes in one pass, allowing for unclassified reads. The whole
+        # entry must match, so e.g. barcode012 or barcode01_rpt are not accepted
+        valid = barcodes.eq("unclassified") | barcodes.str.fullmatch(
+            self.barcode_pattern, na=False
+        )
+        if not valid.all():
+            raise DataFormatError(
+                f"Error in barcode name for {barcodes[~valid].tolist()}. To be valid, must match this regexp: {self.barcode_pattern.pattern}."
+            )
 
     def _check_valid_date_format(self, date: str, format: str = "%Y-%m-%d") -> None:
         """Check that a `date` adheres to a given `format`"""
         try:
-            datetime.strptime(date, format)
-        except ValueError:
+            # ISO dates have a dedicated parser that is much quicker than strptime, but
+            # it accepts other ISO forms too so only use it for YYYY-MM-DD entries
+            if format == "%Y-%m-%d" and len(date) == 10 and date[4] == date[7] == "-":
+                datetime.fromisoformat(date)
+            else:
+                datetime.strptime(date, format)
+        except (TypeError, ValueError):
             raise DataFormatError(
                 f"Date {date} does not adhere to expected format: {format}."
             )
@@ -355,12 +466,15 @@ class ExpMetadataParser:
             df (dataframe)
         """
 
-        for c in columns:
+        # Build the null mask for all columns in one pass, and only slice out the
+        # offending rows for the first column with blanks
+        blank_cols = df[columns].isnull().any()
+        if blank_cols.any():
+            c = blank_cols.idxmax()
             df_filtered = df[df[c].isnull()]
-            if df_filtered.shape[0] > 0:
-                raise DataFormatError(
-                    f"Column {c} contains empty data for {self.expt_id}:\n{df_filtered}"
-                )
+            raise DataFormatError(
+                f"Column {c} contains empty data for {self.expt_id}:\n{df_filtered}"
+            )
 
     def _check_expt_id_fn_sheet(self) -> None:
         """
@@ -379,7 +493,16 @@ class ExpMetadataMerge:
     Extract metadata from multiple files, merge into a coherent dataframe, and optionally export the data
     """
 
-    def __init__(self, filepaths: list[Path], output_folder: Path = None):
+    def __init__(
+        self, filepaths: list[Path], output_folder: Path = None, cache: bool = False
+    ):
+        """
+        Extract, check and merge the metadata from each template file
+
+        Args:
+            cache (bool): Reuse data extracted from unmodified templates on previous
+                runs, stored in output_folder/.cache
+        """
         # Pull in the dynamically created ExpDataSchema as an object
         ExpDataSchema = ExpDataSchemaFields()
         self.DataSchema = ExpDataSchema
@@ -387,48 +510,88 @@ class ExpMetadataMerge:
         # Check that there aren't duplicate experiment IDs
         self._check_duplicate_expid(filepaths)
 
+        # Extracted templates can only be cached alongside the outputs
+        cache_dir = output_folder / ".cache" if cache and output_folder else None
+
         # Output all data into a metadata subfolder for ease of use
         if output_folder:
             output_folder = output_folder / "experimental"
             produce_dir(output_folder)
 
-        # Extract each file as an object into a dictionary
-        expdata_dict = {
-            identify_exptid_from_path(filepath): ExpMetadataParser(
-                filepath, output_folder=output_folder
+        # Reading the Excel files dominates, so extract them in parallel unless there
+        # are too few files to cover the cost of starting the worker processes
+        extract = partial(extract_excel_tabs, cache_dir=cache_dir)
+        extract_args = (
+            filepaths,
+            repeat(ExpMetadataParser.tabnames),
+            repeat(ExpMetadataParser.tab_dtypes()),
+        )
+        if len(filepaths) <= 2:
+            excel_tabs = list(map(extract, *extract_args))
+        else:
+            max_workers = min(len(filepaths), os.cpu_count() or 1)
+            # Windows does not allow more than 61 worker processes
+            if sys.platform == "win32":
+                max_workers = min(max_workers, 61)
+            with ProcessPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                excel_tabs = list(executor.map(extract, *extract_args))
+
+        # Extract each file as an object into a dictionary, keyed on the expt_id each
+        # parser has already checked against its filename
+        expdata_dict = {}
+        for filepath, tabs in zip(filepaths, excel_tabs):
+            expdata = ExpMetadataParser(
+                filepath, output_folder=output_folder, excel_tabs=tabs
             )
-            for filepath in filepaths
-        }
+            expdata_dict[expdata.expt_id] = expdata
         log.info(divider)
 
-        # Concatenate all the exp level data into a df
-        self.expts_df = pd.concat(expdata_dict[key].expt_df for key in expdata_dict)
+        # Concatenate all the exp level data into a df, the per-file index is not needed
+        self.expts_df = pd.concat(
+            [expdata.expt_df for expdata in expdata_dict.values()], ignore_index=True
+        )
         # Concatenate all the rxn level data into a df
-        self.rxns_df = pd.concat(expdata_dict[key].rxn_df for key in expdata_dict)
+        self.rxns_df = pd.concat(
+            [expdata.rxn_df for expdata in expdata_dict.values()], ignore_index=True
+        )
 
-        # Identify the expt_types present and create an empty df for each
-        expt_df_dict = {
-            expdata_dict[key].expt_type: pd.DataFrame for key in expdata_dict
-        }
+        # Group the data from each file by expt_type in a single pass
+        expt_dfs = defaultdict(list)
+        for expdata in expdata_dict.values():
+            expt_dfs[expdata.expt_type].append(expdata.df)
         # Create attribute of expt_types for knowing columns generated
-        self.expt_types = list(expt_df_dict.keys())
+        self.expt_types = list(expt_dfs.keys())
 
-        # Populate df with the appropriate entries and define the
-        for expt_type in expt_df_dict.keys():
+        expt_df_dict = {}
+        for expt_type in self.expt_types:
             # Concatenate data from the same expt_types into the dataframe dict
-            expt_df_dict[expt_type] = pd.concat(
-                expdata_dict[key].df
-                for key in expdata_dict
-                if expdata_dict[key].expt_type == expt_type
-            )
+            expt_df_dict[expt_type] = pd.concat(expt_dfs[expt_type], ignore_index=True)
             # Add instance attribute for each expt_type to self
             setattr(self, expt_type.lower() + "_df", expt_df_dict[expt_type])
 
+        # All per-file data has now been concatenated, so release it before merging
+        del excel_tabs, expdata_dict, expt_dfs
+
         # Provide for a case where only a single expt type is present
         if len(self.expt_types) == 1:
             log.info(f"Only a single expt type ({expt_type}) identified")
             alldata_df = expt_df_dict[expt_type]
         else:
+            # Identifiers are shared between the expt types, so give them a common
+            # categorical dtype to join on
+            expt_df_dict = dict(
+                zip(
+                    expt_df_dict,
+                    set_shared_categories(
+                        list(expt_df_dict.values()),
+                        [
+                            ExpDataSchema.SWGA_IDENTIFIER[0],
+                            ExpDataSchema.PCR_IDENTIFIER[0],
+                        ],
+                    ),
+                )
+            )
+
             # Create joins dict according to experiment types present
             joins = {}
             if "sWGA" in expt_df_dict and "PCR" in expt_df_dict:
@@ -466,22 +629,8 @@ class ExpMetadataMerge:
                 join_dict = joins[join]
                 log.info(f"   {join_dict['joining'][0]} and {join_dict['joining'][1]}")
 
-                # Join the two df together
-                data_df = pd.merge(
-                    left=join_dict["left_df"],
-                    right=join_dict["right_df"],
-                    how="outer",
-                    on=join_dict["on"],
-                    suffixes=join_dict["suffixes"],
-                    indicator=True,
-                )
-
-                # Create df with unmatched records from the right
-                # NOT left as this would highlight all that have not been completed / advanced i.e. sWGA performed, but not PCR
-                missing_records_df = data_df[data_df["_merge"] == "right_only"]
-
                 # Identify names of key columns for reporting back to user and to check for mismatches
-                # Above join appends suffix to column names so create correct list of names
+                # Joining appends suffix to column names so create correct list of names
                 key_cols = [
                     item + suffix
                     for item in join_dict["cols"]
@@ -494,11 +643,33 @@ class ExpMetadataMerge:
                 # Combine for user feedback and include the join column for quick referencing in spreadsheet
                 show_cols = [join_dict["on"]] + expt_id_cols + key_cols
 
+                # Create df with unmatched records from the right
+                # NOT left as this would highlight all that have not been completed / advanced i.e. sWGA performed, but not PCR
+                # These are found from the join keys alone, and suffixed as they would be in a join
+                on_col = join_dict["on"]
+                right_df = join_dict["right_df"]
+                unmatched = ~right_df[on_col].isin(join_dict["left_df"][on_col])
+                missing_records_df = (
+                    right_df[unmatched]
+                    .rename(
+                        columns={
+                            col: col + join_dict["suffixes"][1]
+                            for col in join_dict["cols"] + [ExpDataSchema.EXP_ID[0]]
+                        }
+                    )
+                    .reindex(columns=show_cols)
+                )
+
                 # Ensure that only empty entries are mismatched and not those that should not have a match
                 escape = join_dict.get("mismatch_escape", None)
-                missing_records_df = missing_records_df[
-                    missing_records_df[escape[0]].str.lower() != escape[1]
+                escape_col = missing_records_df[escape[0]]
+                # Identifiers repeat heavily, so lowercase each distinct entry once
+                escaped = [
+                    entry
+                    for entry in escape_col.dropna().unique()
+                    if str(entry).lower() == escape[1]
                 ]
+                missing_records_df = missing_records_df[~escape_col.isin(escaped)]
 
                 # Give user feedback
                 if len(missing_records_df) > 0:
@@ -508,53 +679,78 @@ class ExpMetadataMerge:
                     log.info(missing_records_df[show_cols].to_string(index=False))
                     log.info("")
 
-                # Create df with matched records
-                matched_df = data_df[data_df["_merge"] == "both"]
-                # Identify any mismatched records for the key columns
-                for c in join_dict["cols"]:
-                    # Pull out the two dataseries to compare
-                    col1 = matched_df[f"{c}{join_dict['suffixes'][0]}"]
-                    col2 = matched_df[f"{c}{join_dict['suffixes'][1]}"]
-                    # Identify all that don't match
-                    mismatches_df = matched_df.loc[(col1 != col2)]
-                    # Feedback to user
-                    if mismatches_df.shape[0] > 0:
-                        log.info(f"   WARNING: Mismatches identified for {c}")
-                        log.info(
-                            f"   {mismatches_df[show_cols].to_string(index=False)}"
-                        )
-                        log.info("")
-
-                # To ensure that all columns have the correct suffix, you need to rejoin the columns with or wthout
-                # suffixes depending on whether it is the first (right hand df has no suffix) or last join (both given suffixes)
+                # Each left record can be carried on by many right records, but
+                # identifiers must be unique across all the files
+                left_df = join_dict["left_df"]
+                duplicated = (
+                    left_df[on_col].duplicated(keep=False) & left_df[on_col].notna()
+                )
+                if duplicated.any():
+                    # Report each duplicated identifier with the expts it is found in
+                    duplicates = (
+                        left_df[duplicated]
+                        .groupby(on_col, observed=True)[ExpDataSchema.EXP_ID[0]]
+                        .agg(list)
+                        .to_dict()
+                    )
+                    raise DataFormatError(
+                        f"Column {on_col} entries should be unique across all "
+                        f"{join_dict['joining'][0]} experiments, but these are "
+                        f"duplicated (entry: expt_ids): {duplicates}"
+                    )
+
+                # Join the two df together once, for both checking and combining the data
                 # The following combos are possible SWGA-PCR, PCR-SEQLIB and / or both of them
-                if len(joins) == 1:
-                    # Single  merged so give all a suffix
-                    alldata_df = pd.merge(
-                        left=join_dict["left_df"],
-                        right=join_dict["right_df"],
-                        how="outer",
-                        on=join_dict["on"],
-                        suffixes=(join_dict["suffixes"]),
+                # After the first of two joins the running merge is carried on as the left df
+                data_df = pd.merge(
+                    left=alldata_df if count > 1 else join_dict["left_df"],
+                    right=right_df,
+                    how="outer",
+                    on=on_col,
+                    suffixes=join_dict["suffixes"],
+                )
+                # Outer merges order categorical keys by code, which puts missing keys
+                # first, so move them last as they are when joining on the values
+                data_df = data_df.sort_values(
+                    on_col, na_position="last", kind="stable", ignore_index=True
+                )
+
+                # Identify matched records, every record has an expt_id so those with
+                # both expt_ids present have been joined
+                matched_df = data_df[data_df[expt_id_cols].notna().all(axis=1)]
+                # Compare all of the key columns of both sides in a single pass
+                cols = join_dict["cols"]
+                left_vals, right_vals = (
+                    matched_df[[f"{c}{suffix}" for c in cols]].set_axis(cols, axis=1)
+                    for suffix in join_dict["suffixes"]
+                )
+                mismatched_df = left_vals.ne(right_vals)
+                # Feedback to user, only for the columns with any mismatches
+                for c in mismatched_df.columns[mismatched_df.any()]:
+                    mismatches_df = matched_df.loc[mismatched_df[c]]
+                    log.info(f"   WARNING: Mismatches identified for {c}")
+                    log.info(f"   {mismatches_df[show_cols].to_string(index=False)}")
+                    log.info("")
+
+                # To ensure that all columns have the correct suffix, common fields from the
+                # right df are left without a suffix if another df is still to be added,
+                # so they are suffixed by the last join. Otherwise all are given a suffix
+                if count < len(joins):
+                    common_cols = (
+                        join_dict["left_df"]
+                        .columns.intersection(right_df.columns)
+                        .drop(on_col)
                     )
-                elif count < len(joins):
-                    # Another df to add so leave common fields without a suffix
-                    alldata_df = pd.merge(
-                        left=join_dict["left_df"],
-                        right=join_dict["right_df"],
-                        how="outer",
-                        on=join_dict["on"],
-                        suffixes=([join_dict["suffixes"][0], None]),
+                    alldata_df = data_df.rename(
+                        columns={
+                            col + join_dict["suffixes"][1]: col for col in common_cols
+                        }
                     )
                 else:
-                    # Last df being merged so give all a suffix
-                    alldata_df = pd.merge(
-                        left=alldata_df,
-                        right=join_dict["right_df"],
-                        how="outer",
-                        on=join_dict["on"],
-                        suffixes=(join_dict["suffixes"]),
-                    )
+                    alldata_df = data_df
+
+            # Identifiers are only categorical for the merges
+            alldata_df = unset_categories(alldata_df)
 
             # Collapse columns where multiple identical entries exist
             cols_2_collapse = [
@@ -575,9 +771,6 @@ class ExpMetadataMerge:
             ]
             alldata_df.drop(dropcols, axis=1, inplace=True)
 
-            # Fill in the nan values
-            alldata_df_na = alldata_df.fillna("None")
-
             log.info("Summarising rxn performed")
             # Group and aggregate the df to give a list of all experiments performed on each sample
             col_roots = [
@@ -588,12 +781,19 @@ class ExpMetadataMerge:
                 ExpDataSchema.PCR_IDENTIFIER[0],
                 ExpDataSchema.SEQLIB_IDENTIFIER[0],
             ]
-            collapsed_df = collapse_repeat_columns(alldata_df_na, col_roots)
-            self.exp_summary_df = (
-                collapsed_df[col_roots]
-                .groupby([ExpDataSchema.SAMPLE_ID[0], ExpDataSchema.PCR_ASSAY[0]])
-                .agg(list)
-                .reset_index()
+            # Select only the columns being summarised before collapsing them
+            summary_cols = [
+                col for col in alldata_df.columns if col.startswith(tuple(col_roots))
+            ]
+            collapsed_df = collapse_repeat_columns(alldata_df[summary_cols], col_roots)
+            # Group on category codes rather than hashing the strings per row
+            group_cols = [ExpDataSchema.SAMPLE_ID[0], ExpDataSchema.PCR_ASSAY[0]]
+            collapsed_df = collapsed_df[col_roots].astype(
+                {col: "category" for col in group_cols}
+            )
+            # Keep samples without an assay and leave out missing entries from the lists
+            self.exp_summary_df = unset_categories(
+                aggregate_entries_to_lists(collapsed_df, group_cols)
             )
 
         # Create an instance attribute
@@ -847,47 +1047,65 @@ class SequencingMetadataParser:
         if ExpDataSchema.SAMPLE_TYPE[0] not in match_df.columns:
             match_df[ExpDataSchema.SAMPLE_TYPE[0]] = np.nan
 
+        # Column names used repeatedly below, including per row
+        seq_exp_id_col = SeqDataSchema.EXP_ID[0]
+        sample_type_col = ExpDataSchema.SAMPLE_TYPE[0]
+
         # Define the colnames that are needed for matching seqdata to expdata
         cols_to_match = [
-            SeqDataSchema.EXP_ID[0],
+            seq_exp_id_col,
             SeqDataSchema.BARCODE[0],
             ExpDataSchema.EXP_ID[0],
             ExpDataSchema.BARCODE[0],
         ]
+        # Index the rxn data on its keys once, it is shared by all of the merges below
+        match_df = match_df.set_index(cols_to_match[2:])
+
+        # List the folder once and search the listing for each type of output
+        seqdata_files = identify_all_files(seqdata_folder, recursive=True)
 
         log.info("   Searching for bamstats file(s)")
         bamfiles = identify_files_by_search(
-            seqdata_folder, Regex_patterns.SEQDATA_BAMSTATS_CSV, recursive=True
+            seqdata_folder,
+            Regex_patterns.SEQDATA_BAMSTATS_CSV,
+            recursive=True,
+            files=seqdata_files,
         )
-        summary_bam = concat_files_add_expID(bamfiles, SeqDataSchema.EXP_ID[0])
+        summary_bam = concat_files_add_expID(bamfiles, seq_exp_id_col)
         self.summary_bam = merge_additional_rxn_level_fields(
             summary_bam, match_df, cols_to_match
         )
 
         log.info("   Searching for bedcov file(s)")
         bedcovfiles = identify_files_by_search(
-            seqdata_folder, Regex_patterns.SEQDATA_BEDCOV_CSV, recursive=True
+            seqdata_folder,
+            Regex_patterns.SEQDATA_BEDCOV_CSV,
+            recursive=True,
+            files=seqdata_files,
         )
         # Remove any with nomadic in path as this output is identically named in nomadic and savanna and only want latter
         bedcovfiles = [x for x in bedcovfiles if "nomadic" not in str(x)]
-        summary_bedcov = concat_files_add_expID(bedcovfiles, SeqDataSchema.EXP_ID[0])
+        summary_bedcov = concat_files_add_expID(bedcovfiles, seq_exp_id_col)
         self.summary_bedcov = merge_additional_rxn_level_fields(
             summary_bedcov, match_df, cols_to_match
         )
 
         log.info("   Searching for sample QC file(s)")
         exptqcfiles = identify_files_by_search(
-            seqdata_folder, Regex_patterns.SEQDATA_QC_PER_SAMPLE_CSV, recursive=True
+            seqdata_folder,
+            Regex_patterns.SEQDATA_QC_PER_SAMPLE_CSV,
+            recursive=True,
+            files=seqdata_files,
         )
-        qc_per_sample = concat_files_add_expID(exptqcfiles, SeqDataSchema.EXP_ID[0])
+        qc_per_sample = concat_files_add_expID(exptqcfiles, seq_exp_id_col)
         qc_per_sample = merge_additional_rxn_level_fields(
             qc_per_sample, match_df, cols_to_match
         )
 
         # Add in info on sample type if not supplied from the template
-        qc_per_sample[ExpDataSchema.SAMPLE_TYPE[0]] = qc_per_sample.apply(
-            lambda row: row[ExpDataSchema.SAMPLE_TYPE[0]]
-            if pd.notnull(row[ExpDataSchema.SAMPLE_TYPE[0]])
+        qc_per_sample[sample_type_col] = qc_per_sample.apply(
+            lambda row: row[sample_type_col]
+            if pd.notnull(row[sample_type_col])
             else (
                 "Positive"
                 if row["is_positive"]
@@ -901,9 +1119,12 @@ class SequencingMetadataParser:
 
         log.info("   Searching for experiment QC file(s)")
         qc_per_expt_files = identify_files_by_search(
-            seqdata_folder, Regex_patterns.SEQDATA_QC_PER_EXPT_JSON, recursive=True
+            seqdata_folder,
+            Regex_patterns.SEQDATA_QC_PER_EXPT_JSON,
+            recursive=True,
+            files=seqdata_files,
         )
-        qc_per_expt = concat_files_add_expID(qc_per_expt_files, SeqDataSchema.EXP_ID[0])
+        qc_per_expt = concat_files_add_expID(qc_per_expt_files, seq_exp_id_col)
         # Add in additional calculations not made from savanna
         qc_per_expt[SeqDataSchema.PERCENT_SAMPLES_PASSEDCOV[0]] = (
             qc_per_expt[SeqDataSchema.N_SAMPLES_PASS_COV_THRSHLD[0]]
@@ -991,13 +1212,14 @@ class CombinedData:
         ExpDataSchema = ExpDataSchemaFields_Combined(exp_data)
         SeqDataSchema = sequence_data.DataSchema
         SampleDataSchema = sample_data.DataSchema
+        sample_id_col = ExpDataSchema.SAMPLE_ID[0]
         alldata_df = pd.merge(
             exp_data.all_df,
             sequence_data.summary_bamqc,
             left_on=[
                 ExpDataSchema.BARCODE[0],
                 ExpDataSchema.EXP_ID_SEQLIB[0],
-                ExpDataSchema.SAMPLE_ID[0],
+                sample_id_col,
             ],
             right_on=[
                 SeqDataSchema.BARCODE[0],
@@ -1008,15 +1230,13 @@ class CombinedData:
         )
 
         # Ensure sample_id is a string
-        alldata_df[ExpDataSchema.SAMPLE_ID[0]] = alldata_df[
-            ExpDataSchema.SAMPLE_ID[0]
-        ].astype("string")
+        alldata_df[sample_id_col] = alldata_df[sample_id_col].astype("string")
 
         # Add in the sample data to above merge
         alldata_df = pd.merge(
             alldata_df,
             sample_data.df,
-            left_on=[ExpDataSchema.SAMPLE_ID[0]],
+            left_on=[sample_id_col],
             right_on=[SampleDataSchema.SAMPLE_ID[0]],
             how="outer",
         )